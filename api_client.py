@@ -1,3 +1,4 @@
+import json
 import requests
 import ndjson
 import pandas as pd
@@ -14,16 +15,23 @@ class LichessClient:
         """Initialize the LichessClient."""
         self.base_url = "https://lichess.org/api"
 
-    def get_user_games(self, username, max_games=100):
+    def iter_user_games(self, username, max_games=100):
         """
-        Fetch recent games for a specific user.
+        Stream recent games for a specific user, one game at a time.
+        
+        Lichess sends one JSON object per line, so each game is parsed as its
+        line arrives instead of holding the whole response body in memory.
         
         Args:
             username (str): The Lichess username to fetch games for.
             max_games (int): The maximum number of games to retrieve (default: 100).
             
-        Returns:
-            list: A list of game dictionaries. Returns an empty list if the request fails.
+        Yields:
+            dict: One game dictionary per game.
+            
+        Raises:
+            requests.exceptions.RequestException: If the request fails.
+            ValueError: If a line of the response is not valid JSON.
         """
         # Endpoint for fetching games by user
         url = f"{self.base_url}/games/user/{username}"
@@ -43,17 +51,32 @@ class LichessClient:
             'Accept': 'application/x-ndjson'
         }
 
-        try:
-            # Make the GET request to Lichess API
-            response = requests.get(url, params=params, headers=headers)
+        # Make the GET request to Lichess API and read it line by line
+        with requests.get(url, params=params, headers=headers, stream=True) as response:
             response.raise_for_status() # Raise an error for bad status codes (4xx, 5xx)
             
             # Parse the NDJSON (Newline Delimited JSON) response
             # Lichess returns multiple JSON objects separated by newlines
-            games = response.json(cls=ndjson.Decoder)
-            return games
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def get_user_games(self, username, max_games=100):
+        """
+        Fetch recent games for a specific user.
+        
+        Args:
+            username (str): The Lichess username to fetch games for.
+            max_games (int): The maximum number of games to retrieve (default: 100).
+            
+        Returns:
+            list: A list of game dictionaries. Returns an empty list if the request fails.
+        """
+        try:
+            return list(self.iter_user_games(username, max_games=max_games))
             
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, ValueError) as e:
+            # ValueError covers json.JSONDecodeError from a truncated or malformed line
             print(f"Error fetching games: {e}")
             return []
 
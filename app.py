@@ -3,7 +3,7 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 from api_client import LichessClient
-from data_processing import process_games, get_opening_stats, calculate_risk_metrics, calculate_pacing_metrics, calculate_time_stats, calculate_analysis_metrics
+from data_processing import process_games_cached, get_opening_stats, get_opening_stats_all, summarize_games, calculate_risk_metrics, calculate_pacing_metrics, calculate_time_stats, calculate_analysis_metrics, bin_opponent_ratings
 from eda import plot_win_rate_by_color, plot_rating_trend, plot_top_openings, plot_win_rate_by_opening, plot_time_heatmap, plot_opponent_scatter, plot_termination_pie, plot_correlation_heatmap, plot_radar_chart, plot_move_time_distribution, plot_opening_sunburst
 from llm_client import LLMClient
 from engine_client import EngineClient
@@ -76,6 +76,7 @@ st.set_page_config(
 )
 
 # --- Custom CSS for Chess.com-like Theme ---
+# Must be emitted on every run: Streamlit removes elements that are not re-rendered on a rerun.
 st.markdown("""
 <style>
     /* Main Background */
@@ -205,8 +206,34 @@ if not hasattr(db, 'connected'):
 # Let's check app.py again. Line 168: `if db.connected:`
 # So `ChessDatabaseManager` MUST have a `connected` property or attribute.
 
+# AI Provider Registry: name -> (client class, API key env var, display label)
+AI_PROVIDERS = {
+    "Free Llama (Default)": (PuterClient, None, "Free Llama"),
+    "Google Gemini": (LLMClient, "GOOGLE_API_KEY", "Gemini"),
+    "Groq (Llama 3)": (GroqClient, "GROQ_API_KEY", "Groq (Llama 3)"),
+}
+
+@st.cache_resource
+def get_ai_client(provider, api_key):
+    # Shared across sessions: only for clients that keep their key on the instance,
+    # so each api_key gets its own client
+    client_cls, _, _ = AI_PROVIDERS[provider]
+    return client_cls()
+
+def resolve_ai_client(provider):
+    """Return the client for a provider, or None if its API key is missing."""
+    client_cls, env_key, _ = AI_PROVIDERS[provider]
+    api_key = os.getenv(env_key) if env_key else None
+    if env_key and not api_key:
+        return None
+    if client_cls is LLMClient:
+        # genai.configure sets the key process-wide, so a cached Gemini client could
+        # end up running on another session's key; configure it for this run instead
+        return LLMClient()
+    return get_ai_client(provider, api_key)
+
 # AI Provider Selection
-ai_provider = st.sidebar.selectbox("AI Provider", ["Free Llama (Default)", "Google Gemini", "Groq (Llama 3)"])
+ai_provider = st.sidebar.selectbox("AI Provider", list(AI_PROVIDERS))
 if ai_provider == "Google Gemini":
     api_key = st.sidebar.text_input("Google API Key", type="password", help="Get it from aistudio.google.com")
     if api_key:
@@ -230,7 +257,7 @@ with col_fetch:
             games = client.get_user_games(username, max_games=num_games)
             
             if games:
-                df = process_games(games, username)
+                df = process_games_cached(games, username)
                 
                 # Save to DB automatically
                 if db.connected:
@@ -241,15 +268,20 @@ with col_fetch:
                         st.toast("MongoDB not connected. Games loaded but not saved.", icon="⚠️")
                         print(f"DB Save Error: {e}")
                 
-                opening_stats = get_opening_stats(df)
+                # Overall and per-color opening stats in one call
+                opening_stats, stats_white, stats_black = get_opening_stats_all(df)
                 
                 # Calculate Player Metrics
+                # One counting pass over the results instead of a mask per outcome
+                result_counts = df['result'].value_counts()
                 total_games = len(df)
-                win_count = len(df[df['result'] == 'Win'])
-                loss_count = len(df[df['result'] == 'Loss'])
-                draw_count = len(df[df['result'] == 'Draw'])
+                win_count = int(result_counts.get('Win', 0))
+                loss_count = int(result_counts.get('Loss', 0))
+                draw_count = int(result_counts.get('Draw', 0))
                 win_rate = win_count / total_games if total_games > 0 else 0
                 current_rating = df.iloc[0]['user_rating'] if not df.empty else 'N/A'
+                # Latest rating per time control (first row of each speed, like df.iloc[0])
+                latest_ratings = df.drop_duplicates('speed').set_index('speed')['user_rating'].to_dict()
 
                 player_stats = {
                     'username': username,
@@ -262,16 +294,11 @@ with col_fetch:
                 st.session_state['game_data'] = df
                 st.session_state['opening_stats'] = opening_stats
                 st.session_state['player_stats'] = player_stats
+                st.session_state['latest_ratings'] = latest_ratings
                 st.session_state['raw_games'] = games
+                st.session_state.pop('coaching_reports', None)
                 
                 # --- Generate Context for Chatbot ---
-                # Split data by color
-                df_white = df[df['user_color'] == 'white']
-                df_black = df[df['user_color'] == 'black']
-                
-                stats_white = get_opening_stats(df_white)
-                stats_black = get_opening_stats(df_black)
-                
                 # Helper to format opening stats
                 def format_openings(stats, label):
                     details = []
@@ -287,13 +314,14 @@ with col_fetch:
                 time_controls = ['rapid', 'blitz', 'classical']
                 tc_context = ""
                 
+                speed_counts = df['speed'].value_counts()
+                speed_wins = df.loc[df['result'] == 'Win', 'speed'].value_counts()
+                
                 for tc in time_controls:
-                    df_tc = df[df['speed'] == tc]
-                    if not df_tc.empty:
-                        tc_games = len(df_tc)
-                        tc_wins = len(df_tc[df_tc['result'] == 'Win'])
-                        tc_rate = tc_wins / tc_games if tc_games > 0 else 0
-                        tc_rating = df_tc.iloc[0]['user_rating']
+                    tc_games = int(speed_counts.get(tc, 0))
+                    if tc_games > 0:
+                        tc_rate = int(speed_wins.get(tc, 0)) / tc_games
+                        tc_rating = latest_ratings[tc]
                         tc_context += f"\n{tc.capitalize()} Stats:\nRating: {tc_rating}, Win Rate: {tc_rate:.1%} ({tc_games} games)\n"
                 
                 context_str = (
@@ -326,12 +354,16 @@ with col_load:
                         opening_stats = get_opening_stats(df)
                         
                         # Calculate Player Metrics
+                        # One counting pass over the results instead of a mask per outcome
+                        result_counts = df['result'].value_counts()
                         total_games = len(df)
-                        win_count = len(df[df['result'] == 'Win'])
-                        loss_count = len(df[df['result'] == 'Loss'])
-                        draw_count = len(df[df['result'] == 'Draw'])
+                        win_count = int(result_counts.get('Win', 0))
+                        loss_count = int(result_counts.get('Loss', 0))
+                        draw_count = int(result_counts.get('Draw', 0))
                         win_rate = win_count / total_games if total_games > 0 else 0
                         current_rating = df.iloc[0]['user_rating'] if not df.empty else 'N/A'
+                        # Latest rating per time control (first row of each speed, like df.iloc[0])
+                        latest_ratings = df.drop_duplicates('speed').set_index('speed')['user_rating'].to_dict()
 
                         player_stats = {
                             'username': username,
@@ -343,7 +375,9 @@ with col_load:
                         st.session_state['game_data'] = df
                         st.session_state['opening_stats'] = opening_stats
                         st.session_state['player_stats'] = player_stats
+                        st.session_state['latest_ratings'] = latest_ratings
                         st.session_state['raw_games'] = df.to_dict('records') # Approximation
+                        st.session_state.pop('coaching_reports', None)
                         
                         # --- Automatic Enrichment (Check & Repair) ---
                         # Identify games with missing clocks/analysis
@@ -518,14 +552,34 @@ if 'game_data' in st.session_state:
     opening_stats = st.session_state['opening_stats']
     player_stats = st.session_state['player_stats']
     
+    # Defensive checks for derived columns (handles stale session state and DB loads).
+    # Applied to the stored frame so the backfill runs once, not on every rerun's filtered copy.
+    if 'ply_count' not in df.columns:
+        df['ply_count'] = df['moves'].apply(lambda x: x.count(' ') + 1 if isinstance(x, str) and x else 0)
+        
+    if 'hour' not in df.columns:
+        df['hour'] = df['date'].dt.hour
+        
+    if 'day_of_week' not in df.columns:
+        df['day_of_week'] = df['date'].dt.day_name()
+        
+    if 'opponent_rating_bin' not in df.columns:
+        df['opponent_rating_bin'] = bin_opponent_ratings(df['opponent_rating'])
+    
     # --- Header Section (Profile) ---
-    st.markdown(f"""
+    # Build the header HTML once per user and reuse it on later reruns
+    cached_header = st.session_state.get('profile_header')
+    if not cached_header or cached_header[0] != player_stats['username']:
+        header_html = f"""
     <div class="profile-header">
         <div class="profile-flag">♟️</div>
         <div class="profile-name">{player_stats['username']}</div>
         <div style="color: #a7a6a2;">🇺🇸</div>
     </div>
-    """, unsafe_allow_html=True)
+    """
+        cached_header = (player_stats['username'], header_html)
+        st.session_state['profile_header'] = cached_header
+    st.markdown(cached_header[1], unsafe_allow_html=True)
     
     # --- Global Time Control Filter ---
     st.markdown("### ⏱️ Time Control Filter")
@@ -539,21 +593,19 @@ if 'game_data' in st.session_state:
         
     # Recalculate Stats based on Filter
     if not filtered_df.empty:
-        # Update Opening Stats for filtered data
-        filtered_opening_stats = get_opening_stats(filtered_df)
+        # Update Opening Stats for filtered data (overall + per color in one call)
+        filtered_opening_stats, white_stats, black_stats = get_opening_stats_all(filtered_df)
         
         # Update Metrics
         filtered_total_games = len(filtered_df)
-        filtered_wins = len(filtered_df[filtered_df['result'] == 'Win'])
+        filtered_wins = int(filtered_df['result'].value_counts().get('Win', 0))
         filtered_win_rate = filtered_wins / filtered_total_games if filtered_total_games > 0 else 0
-        filtered_rating = filtered_df.iloc[0]['user_rating']
+        latest_ratings = st.session_state.get('latest_ratings', {})
+        if rating_category != "Overall" and rating_category.lower() in latest_ratings:
+            filtered_rating = latest_ratings[rating_category.lower()]
+        else:
+            filtered_rating = filtered_df.iloc[0]['user_rating']
         # Calculate Best Openings by Color (Highest Win Rate with min games)
-        white_df = filtered_df[filtered_df['user_color'] == 'white']
-        black_df = filtered_df[filtered_df['user_color'] == 'black']
-        
-        white_stats = get_opening_stats(white_df)
-        black_stats = get_opening_stats(black_df)
-        
         def get_best_opening(stats):
             if stats.empty:
                 return "N/A"
@@ -585,6 +637,7 @@ if 'game_data' in st.session_state:
         best_white = "N/A"
         best_black = "N/A"
         filtered_opening_stats = pd.DataFrame()
+        white_stats, black_stats = pd.DataFrame(), pd.DataFrame()
 
     # --- Summary Cards (Updated with Filtered Data) ---
     col1, col2, col3, col4, col5 = st.columns(5)
@@ -667,34 +720,6 @@ if 'game_data' in st.session_state:
         # Handle "All" (500) or specific limit
         limit = games_per_page if games_per_page != 500 else len(df)
         
-        # Defensive check for ply_count (handles stale session state)
-        if 'ply_count' not in df.columns:
-            df['ply_count'] = df['moves'].apply(lambda x: len(x.split()) if isinstance(x, str) else 0)
-            
-        # Defensive checks for other derived columns (hour, day_of_week, opponent_rating_bin)
-        if 'hour' not in df.columns:
-            df['hour'] = df['date'].dt.hour
-            
-        if 'day_of_week' not in df.columns:
-            df['day_of_week'] = df['date'].dt.day_name()
-            
-        if 'opponent_rating_bin' not in df.columns:
-            def get_bin(rating):
-                if pd.isna(rating): return "Unknown"
-                try:
-                    r = int(rating)
-                    if r < 1000: return "<1000"
-                    elif 1000 <= r < 1200: return "1000-1200"
-                    elif 1200 <= r < 1400: return "1200-1400"
-                    elif 1400 <= r < 1600: return "1400-1600"
-                    elif 1600 <= r < 1800: return "1600-1800"
-                    elif 1800 <= r < 2000: return "1800-2000"
-                    elif 2000 <= r < 2200: return "2000-2200"
-                    else: return "2200+"
-                except:
-                    return "Unknown"
-            df['opponent_rating_bin'] = df['opponent_rating'].apply(get_bin)
-        
         try:
             selected_game_ids = render_game_list(df.head(limit))
         except Exception as e:
@@ -938,15 +963,9 @@ if 'game_data' in st.session_state:
                             
                             # Call AI
                             ai_response = "AI Analysis unavailable (Check API Key)"
-                            if ai_provider == "Google Gemini" and os.getenv("GOOGLE_API_KEY"):
-                                client = LLMClient()
-                                ai_response = client.chat([{"role": "user", "content": prompt}])
-                            elif ai_provider == "Groq (Llama 3)" and os.getenv("GROQ_API_KEY"):
-                                client = GroqClient()
-                                ai_response = client.chat([{"role": "user", "content": prompt}])
-                            else:
-                                client = PuterClient()
-                                ai_response = client.chat([{"role": "user", "content": prompt}])
+                            # Fall back to Puter if the selected provider has no key
+                            client = resolve_ai_client(ai_provider) or resolve_ai_client("Free Llama (Default)")
+                            ai_response = client.chat([{"role": "user", "content": prompt}])
                                 
                             # Add to Chat
                             st.session_state.messages.append({"role": "assistant", "content": f"**Game Analysis ({row['opening_name']}):**\n\n{ai_response}"})
@@ -1018,8 +1037,10 @@ if 'game_data' in st.session_state:
             st.subheader("Performance Overview")
             
             # --- Pacing & Risk Analysis Section ---
-            risk_data = calculate_risk_metrics(df)
-            pacing_data = calculate_pacing_metrics(df, rating_category)
+            # Result counts and average length are shared by both metrics
+            game_summary = summarize_games(df)
+            risk_data = calculate_risk_metrics(df, summary=game_summary)
+            pacing_data = calculate_pacing_metrics(df, rating_category, summary=game_summary)
             
             st.markdown("### ⚠️ Style & Pacing Analysis")
             r_col1, r_col2, r_col3 = st.columns([1, 1, 2])
@@ -1326,38 +1347,34 @@ if 'game_data' in st.session_state:
         if risk_data is None or pacing_data is None:
             st.warning(f"⚠️ Not enough data in **{rating_category}** mode to generate a full AI report. Please play more games or select 'Overall'.")
         else:
-            # Calculate Analysis Metrics (ACPL, Blunders)
-            raw_games = st.session_state.get('raw_games')
-            analysis_stats = None
-            if raw_games:
-                if rating_category != "Overall":
-                    filtered_games_ai = [g for g in raw_games if g.get('speed') == rating_category.lower()]
-                else:
-                    filtered_games_ai = raw_games
-                analysis_stats = calculate_analysis_metrics(filtered_games_ai, username, pacing_label=pacing_data['label'])
-
-            # Calculate Opening Stats by Color for AI Context
-            opening_stats_white = get_opening_stats(df, color="white")
-            opening_stats_black = get_opening_stats(df, color="black")
-
+            # Reports are generated on request and cached per time-control filter,
+            # so chat turns and tab switches don't re-run a slow LLM call.
+            reports = st.session_state.setdefault('coaching_reports', {})
+            
             # Check for API Key based on provider
-            if ai_provider == "Google Gemini" and os.getenv("GOOGLE_API_KEY"):
-                with st.spinner("Generating insights with Gemini..."):
-                    llm = LLMClient()
-                    report = llm.generate_coaching_report(player_stats, opening_stats, risk_data, pacing_data, time_stats, analysis_stats, opening_stats_white, opening_stats_black)
-                    st.markdown(report)
-            elif ai_provider == "Groq (Llama 3)" and os.getenv("GROQ_API_KEY"):
-                with st.spinner("Generating insights with Groq (Llama 3)..."):
-                    llm = GroqClient()
-                    report = llm.generate_coaching_report(player_stats, opening_stats, risk_data, pacing_data, time_stats, analysis_stats, opening_stats_white, opening_stats_black)
-                    st.markdown(report)
-            elif ai_provider == "Free Llama (Default)":
-                 with st.spinner("Generating insights with Free Llama..."):
-                    llm = PuterClient()
-                    report = llm.generate_coaching_report(player_stats, opening_stats, risk_data, pacing_data, time_stats, analysis_stats, opening_stats_white, opening_stats_black)
-                    st.markdown(report)
-            else:
+            llm = resolve_ai_client(ai_provider)
+            
+            if llm is None:
                 st.warning(f"⚠️ Please enter your {ai_provider} API Key in the sidebar.")
+            elif st.button("Generate Coaching Report", key="generate_report"):
+                # Calculate Analysis Metrics (ACPL, Blunders)
+                raw_games = st.session_state.get('raw_games')
+                analysis_stats = None
+                if raw_games:
+                    if rating_category != "Overall":
+                        filtered_games_ai = [g for g in raw_games if g.get('speed') == rating_category.lower()]
+                    else:
+                        filtered_games_ai = raw_games
+                    analysis_stats = calculate_analysis_metrics(filtered_games_ai, username, pacing_label=pacing_data['label'])
+
+                # Opening Stats by Color for AI Context (computed with the filtered stats above)
+                opening_stats_white, opening_stats_black = white_stats, black_stats
+
+                with st.spinner(f"Generating insights with {AI_PROVIDERS[ai_provider][2]}..."):
+                    reports[rating_category] = llm.generate_coaching_report(player_stats, opening_stats, risk_data, pacing_data, time_stats, analysis_stats, opening_stats_white, opening_stats_black)
+            
+            if rating_category in reports:
+                st.markdown(reports[rating_category])
     
     # Tab 5: Global Database (MongoDB)
     with tab5:
@@ -1486,17 +1503,9 @@ with st.sidebar:
                     # Get Context
                     context = st.session_state.get('chat_context')
                     
-                    # Logic: Use Selected Provider
-                    if ai_provider == "Google Gemini" and os.getenv("GOOGLE_API_KEY"):
-                        client = LLMClient()
-                        response = client.chat(st.session_state.messages, context=context)
-                    elif ai_provider == "Groq (Llama 3)" and os.getenv("GROQ_API_KEY"):
-                        client = GroqClient()
-                        response = client.chat(st.session_state.messages, context=context)
-                    else:
-                        # Default to Puter
-                        client = PuterClient()
-                        response = client.chat(st.session_state.messages, context=context)
+                    # Logic: Use Selected Provider (default to Puter if no key)
+                    client = resolve_ai_client(ai_provider) or resolve_ai_client("Free Llama (Default)")
+                    response = client.chat(st.session_state.messages, context=context)
                     
                     st.markdown(response)
             
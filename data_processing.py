@@ -1,5 +1,87 @@
+import logging
+import os
+import re
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
 
+logger = logging.getLogger(__name__)
+
+# python-chess is imported inside the move-level functions, so code that only
+# needs the DataFrame helpers doesn't pay for loading it
+
+# Result codes; also the category order of the 'result' column (column order: wins, draws, losses)
+RESULT_CODES = {'Win': 0, 'Draw': 1, 'Loss': 2}
+
+# Shared read-only default for nested .get() lookups (never stored in the output)
+_EMPTY = {}
+
+# Opponent rating ranges used by the charts (lower edge inclusive)
+RATING_BIN_EDGES = [-np.inf, 1000, 1200, 1400, 1600, 1800, 2000, 2200, np.inf]
+RATING_BIN_LABELS = ["<1000", "1000-1200", "1200-1400", "1400-1600", "1600-1800", "1800-2000", "2000-2200", "2200+"]
+# Ordered dtype of the opponent_rating_bin column (1-byte codes, sorts by rating)
+RATING_BIN_DTYPE = pd.CategoricalDtype(RATING_BIN_LABELS + ["Unknown"], ordered=True)
+
+# Low-cardinality text columns stored as categoricals (int codes + a small lookup table)
+# ('result' is built with the fixed RESULT_CODES categories instead)
+CATEGORICAL_COLUMNS = ['variant', 'speed', 'user_color', 'termination', 'eco', 'opening_name', 'day_of_week']
+
+# Rating columns stored as compact numbers by process_games
+RATING_COLUMNS = ['user_rating', 'opponent_rating', 'white_rating', 'black_rating']
+
+# Processed games are kept here per user so a refresh only processes new games
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'lichess_coach')
+# Bump when process_games' columns or dtypes change; caches with another version are discarded
+CACHE_VERSION = 1
+
+def bin_opponent_ratings(ratings):
+    """
+    Group opponent ratings into rating ranges in one vectorized pass.
+    
+    Args:
+        ratings (pd.Series): Opponent ratings (missing or zero ratings map to "Unknown").
+        
+    Returns:
+        pd.Series: Rating range label per game (RATING_BIN_DTYPE).
+    """
+    ratings = pd.to_numeric(ratings, errors='coerce')
+    bins = pd.cut(ratings, bins=RATING_BIN_EDGES, labels=RATING_BIN_LABELS, right=False).astype(RATING_BIN_DTYPE)
+    return bins.where(ratings.fillna(0) != 0, "Unknown")
+
+def _pick_by_color(is_white, white_values, black_values):
+    """Select the white or black value per game, keeping pandas' usual dtype inference."""
+    picked = np.where(is_white, np.asarray(white_values, dtype=object), np.asarray(black_values, dtype=object))
+    return pd.Series(picked, dtype=object).infer_objects()
+
+def _extract_players(game):
+    """
+    Both players' dicts, names and ratings from a Lichess game dict.
+    
+    Returns:
+        tuple: (white, black, white_user, black_user, white_rating, black_rating)
+    """
+    try:
+        # Common case: two registered players, so every key is present
+        players = game['players']
+        white = players['white']
+        black = players['black']
+        return white, black, white['user']['name'], black['user']['name'], white.get('rating'), black.get('rating')
+    except KeyError:
+        # Anonymous players and AI opponents have no 'user' entry
+        players = game.get('players', _EMPTY)
+        white = players.get('white', _EMPTY)
+        black = players.get('black', _EMPTY)
+        white_user = white.get('user', _EMPTY).get('name', 'Unknown')
+        black_user = black.get('user', _EMPTY).get('name', 'Unknown')
+        return white, black, white_user, black_user, white.get('rating'), black.get('rating')
+
+def _compact_ratings(ratings):
+    """Store ratings as int16, or float32 when some are missing (NaN needs a float)."""
+    ratings = pd.to_numeric(ratings, errors='coerce')
+    return ratings.astype(np.int16 if ratings.notna().all() else np.float32)
+
 def process_games(games, username):
     """
     Process raw game data into a Pandas DataFrame suitable for analysis.
@@ -8,18 +90,27 @@ def process_games(games, username):
     and enriches the data with time-based and opponent-based features.
     
     Args:
-        games (list): List of game dictionaries from Lichess API.
+        games (iterable): Game dictionaries from Lichess API (a list, or a generator
+            such as LichessClient.iter_user_games).
         username (str): The username of the player to analyze (used to determine color).
         
     Returns:
         pd.DataFrame: Processed DataFrame containing one row per game.
     """
+    if not isinstance(games, (list, tuple)):
+        games = list(games)
     if not games:
         return pd.DataFrame()
 
-    processed_data = []
+    # Column-wise buffers: one pre-sized list per output column instead of a dict per game
+    n = len(games)
+    game_ids, variants, speeds, created_ats, winners = ([None] * n for _ in range(5))
+    terminations, ecos, opening_names, ply_counts, move_lists = ([None] * n for _ in range(5))
+    white_users, black_users, white_ratings, black_ratings = ([None] * n for _ in range(4))
+    white_acpls, black_acpls, clocks, clock_settings = ([None] * n for _ in range(4))
+    analyses, white_analyses, black_analyses = ([None] * n for _ in range(3))
     
-    for game in games:
+    for i, game in enumerate(games):
         # --- Extract Basic Info ---
         game_id = game.get('id')
         rated = game.get('rated', False)
@@ -29,105 +120,272 @@ def process_games(games, username):
         created_at = game.get('createdAt') # Timestamp in milliseconds
         
         # --- Extract Player Info ---
-        white = game.get('players', {}).get('white', {})
-        black = game.get('players', {}).get('black', {})
-        
-        white_user = white.get('user', {}).get('name', 'Unknown')
-        black_user = black.get('user', {}).get('name', 'Unknown')
+        white, black, white_user, black_user, white_rating, black_rating = _extract_players(game)
         
-        white_rating = white.get('rating')
-        black_rating = black.get('rating')
-        
-        # --- Determine User's Color & Stats ---
-        # We need to know if the user played White or Black to calculate results correctly
-        if white_user.lower() == username.lower():
-            user_color = 'white'
-            opponent_rating = black_rating
-            user_rating = white_rating
-        else:
-            user_color = 'black'
-            opponent_rating = white_rating
-            user_rating = black_rating
-            
-        # --- Determine Result ---
+        # --- User's Color & Result ---
+        # Derived for all games at once after the loop
         winner = game.get('winner') # 'white', 'black', or None (draw)
-        if winner:
-            if winner == user_color:
-                result = 'Win'
-            else:
-                result = 'Loss'
-        else:
-            result = 'Draw'
             
         # --- Extract Opening Info ---
-        opening = game.get('opening', {})
+        opening = game.get('opening', _EMPTY)
         eco = opening.get('eco') # ECO code (e.g., B01)
         opening_name = opening.get('name')
         
         # --- Calculate Move Count ---
         moves = game.get('moves', '')
-        # Calculate ply (half-moves)
-        ply_count = len(moves.split()) if moves else 0
+        # Calculate ply (half-moves): moves are single-space separated, so count the gaps
+        ply_count = moves.count(' ') + 1 if moves else 0
         
         # --- Advanced Features (Phase 2) ---
         
         # 1. Game Termination Status
         status = game.get('status') # e.g., mate, resign, outoftime, draw
         
-        # 2. Time Analysis
-        # Convert timestamp to datetime object
-        dt = pd.to_datetime(created_at, unit='ms')
-        
-        # 3. Opponent Rating Binning
-        # Group opponents into rating ranges for analysis
-        if opponent_rating:
-            if opponent_rating < 1000: op_bin = "<1000"
-            elif 1000 <= opponent_rating < 1200: op_bin = "1000-1200"
-            elif 1200 <= opponent_rating < 1400: op_bin = "1200-1400"
-            elif 1400 <= opponent_rating < 1600: op_bin = "1400-1600"
-            elif 1600 <= opponent_rating < 1800: op_bin = "1600-1800"
-            elif 1800 <= opponent_rating < 2000: op_bin = "1800-2000"
-            elif 2000 <= opponent_rating < 2200: op_bin = "2000-2200"
-            else: op_bin = "2200+"
-        else:
-            op_bin = "Unknown"
-
-        # Append processed game to list
-        processed_data.append({
-            'game_id': game_id,
-            'date': dt,
-            'hour': dt.hour,
-            'day_of_week': dt.day_name(),
-            'variant': variant,
-            'speed': speed,
-            'user_color': user_color,
-            'user_rating': user_rating,
-            'opponent_rating': opponent_rating,
-            'opponent_rating_bin': op_bin,
-            'result': result,
-            'termination': status,
-            'eco': eco,
-            'eco': eco,
-            'opening_name': opening_name,
-            'ply_count': ply_count,
-            'white_user': white_user,
-            'black_user': black_user,
-            'white_rating': white_rating,
-            'black_rating': black_rating,
-            'acpl': game.get('players', {}).get(user_color, {}).get('analysis', {}).get('acpl'),
-            'moves': moves,
-            # Raw Data for Metrics (Time & Accuracy)
-            'clocks': game.get('clocks', []),
-            'clock_settings': game.get('clock', {}),
-            'analysis': game.get('analysis', []),
-            'white_analysis': game.get('players', {}).get('white', {}).get('analysis', {}),
-            'black_analysis': game.get('players', {}).get('black', {}).get('analysis', {})
-        })
-        
-    # Convert list of dicts to DataFrame
-    df = pd.DataFrame(processed_data)
+        # 2. Time Analysis (timestamps are converted in one vectorized pass after the loop)
+        # 3. Opponent Rating Binning is done with pd.cut after the loop
+
+        # Store processed game in the column buffers
+        game_ids[i] = game_id
+        variants[i] = variant
+        speeds[i] = speed
+        created_ats[i] = created_at
+        winners[i] = winner
+        terminations[i] = status
+        ecos[i] = eco
+        opening_names[i] = opening_name
+        ply_counts[i] = ply_count
+        white_users[i] = white_user
+        black_users[i] = black_user
+        white_ratings[i] = white_rating
+        black_ratings[i] = black_rating
+        white_acpls[i] = white.get('analysis', _EMPTY).get('acpl')
+        black_acpls[i] = black.get('analysis', _EMPTY).get('acpl')
+        move_lists[i] = moves
+        # Raw Data for Metrics (Time & Accuracy)
+        clocks[i] = game.get('clocks', [])
+        clock_settings[i] = game.get('clock', {})
+        analyses[i] = game.get('analysis', [])
+        white_analyses[i] = white.get('analysis', {})
+        black_analyses[i] = black.get('analysis', {})
+        
+    # --- Determine User's Color & Result ---
+    # We need to know if the user played White or Black to calculate results correctly
+    is_white = pd.Series(white_users, dtype=object).str.lower().eq(username.lower()).to_numpy(dtype=bool)
+    user_colors = np.where(is_white, 'white', 'black')
+    
+    winners = np.asarray(winners, dtype=object)
+    has_winner = pd.notna(winners) & (winners != '')
+    results = np.where(has_winner, np.where(winners == user_colors, 'Win', 'Loss'), 'Draw')
+    
+    # Build the DataFrame straight from the column buffers
+    df = pd.DataFrame({
+        'game_id': game_ids,
+        'variant': variants,
+        'speed': speeds,
+        'user_color': user_colors,
+        'user_rating': _pick_by_color(is_white, white_ratings, black_ratings),
+        'opponent_rating': _pick_by_color(is_white, black_ratings, white_ratings),
+        'result': pd.Categorical(results, categories=list(RESULT_CODES)),
+        'termination': terminations,
+        'eco': ecos,
+        'opening_name': opening_names,
+        'ply_count': ply_counts,
+        'white_user': white_users,
+        'black_user': black_users,
+        'white_rating': white_ratings,
+        'black_rating': black_ratings,
+        'acpl': _pick_by_color(is_white, white_acpls, black_acpls),
+        'moves': move_lists,
+        'clocks': clocks,
+        'clock_settings': clock_settings,
+        'analysis': analyses,
+        'white_analysis': white_analyses,
+        'black_analysis': black_analyses
+    })
+    
+    # Convert all timestamps at once (epoch ms cast straight to datetime64[ms], missing -> NaT)
+    # and derive the time features from them
+    dt = pd.Series(np.array(created_ats, dtype='float64').astype('datetime64[ms]'))
+    df.insert(1, 'date', dt)
+    df.insert(2, 'hour', dt.dt.hour)
+    df.insert(3, 'day_of_week', dt.dt.day_name())
+    
+    # Group opponents into rating ranges for analysis
+    df.insert(df.columns.get_loc('opponent_rating') + 1, 'opponent_rating_bin', bin_opponent_ratings(df['opponent_rating']))
+    
+    for col in CATEGORICAL_COLUMNS:
+        df[col] = df[col].astype('category')
+        
+    # Narrow numeric columns: ratings fit in int16, and so does the ply count
+    for col in RATING_COLUMNS:
+        df[col] = _compact_ratings(df[col])
+    df['ply_count'] = df['ply_count'].astype(np.int16)
     return df
 
+def _result_codes(results):
+    """Integer result codes per game (see RESULT_CODES), -1 for anything else."""
+    return pd.Categorical(results, categories=list(RESULT_CODES)).codes
+
+def _cache_path(username):
+    """Location of the processed-games cache for a user, or None if the name isn't a valid Lichess username."""
+    # Lichess usernames are letters, digits, '_' and '-'; anything else (e.g. '../')
+    # must not reach a path that gets unpickled
+    if not isinstance(username, str) or not re.fullmatch(r'[A-Za-z0-9_-]+', username):
+        return None
+    return os.path.join(CACHE_DIR, f"{username.lower()}.pkl")
+
+def _game_fingerprint(game):
+    """The parts of a raw game Lichess can fill in after the first fetch (analysis, clocks)."""
+    players = game.get('players') or _EMPTY
+    return (
+        bool(game.get('analysis')),
+        bool(game.get('clocks')),
+        bool(players.get('white', _EMPTY).get('analysis')),
+        bool(players.get('black', _EMPTY).get('analysis'))
+    )
+
+def process_games_cached(games, username):
+    """
+    Same as process_games, but reuses rows processed on earlier runs.
+    
+    The processed DataFrame is kept on disk per user, together with a fingerprint
+    of each game. Games that are new, or whose analysis/clock data changed since
+    they were cached, are processed; the rest are read back from the cache. The
+    cache only keeps the games of the latest pull.
+    
+    Args:
+        games (list): List of game dictionaries from Lichess API.
+        username (str): The username of the player to analyze.
+        
+    Returns:
+        pd.DataFrame: Processed DataFrame with one row per game, in the order of `games`.
+    """
+    if not games:
+        return pd.DataFrame()
+        
+    path = _cache_path(username)
+    ids = [game.get('id') for game in games]
+    if path is None or None in ids or len(set(ids)) != len(ids):
+        # No safe cache file for this name, or can't key rows reliably: process everything
+        return process_games(games, username)
+        
+    fingerprints = {game_id: _game_fingerprint(game) for game, game_id in zip(games, ids)}
+        
+    try:
+        cache = pd.read_pickle(path)
+    except Exception:
+        cache = None
+    if not isinstance(cache, dict) or cache.get('version') != CACHE_VERSION:
+        # Missing, unreadable, or written by another version of process_games
+        cache = None
+        
+    # Rows that can be reused: games of this pull that haven't changed since they were cached
+    stored = cache['fingerprints'] if cache is not None else _EMPTY
+    reusable = {game_id for game_id in ids if stored.get(game_id) == fingerprints[game_id]}
+    new_games = [game for game, game_id in zip(games, ids) if game_id not in reusable]
+    
+    parts = []
+    if new_games:
+        parts.append(process_games(new_games, username))
+    if reusable:
+        cached = cache['games']
+        parts.append(cached[cached['game_id'].isin(reusable)])
+    combined = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+        
+    # Rewrite the cache when rows were added, re-processed or dropped (games no longer pulled)
+    if cache is None or new_games or len(cache['games']) != len(combined):
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            pd.to_pickle({'version': CACHE_VERSION, 'games': combined, 'fingerprints': fingerprints}, path)
+        except Exception as e:
+            logger.error(f"Cache Save Error: {e}")
+            
+    df = combined.set_index('game_id', drop=False).loc[ids].reset_index(drop=True)
+    
+    # Categories and rating dtypes of this selection only, as process_games would give
+    for col in CATEGORICAL_COLUMNS:
+        df[col] = df[col].astype('category').cat.remove_unused_categories()
+    for col in RATING_COLUMNS:
+        df[col] = _compact_ratings(df[col])
+    # Cached and fresh rows can disagree on acpl (floats vs all-None object), so re-infer it
+    df['acpl'] = df['acpl'].astype(object).where(df['acpl'].notna(), None).infer_objects()
+    return df
+
+def _aggregate_openings(df, keys):
+    """
+    Aggregate game results per opening (shared by the per-color and overall stats).
+    
+    Games are mapped to integer group codes once, and every column is then
+    reduced with np.bincount over those codes (one C loop each, no hashing).
+    
+    Args:
+        df (pd.DataFrame): The processed games DataFrame.
+        keys (str or list): Column(s) to group by, e.g. 'opening_name' or ['user_color', 'opening_name'].
+        
+    Returns:
+        pd.DataFrame: Aggregated stats indexed by `keys`, sorted by key like a groupby.
+    """
+    key_cols = [keys] if isinstance(keys, str) else list(keys)
+    
+    # Sorted integer codes per key; games with a missing key (-1) are left out, as in groupby
+    factorized = [pd.factorize(df[k], sort=True) for k in key_cols]
+    dims = tuple(len(uniques) for _, uniques in factorized)
+    valid = np.logical_and.reduce([codes >= 0 for codes, _ in factorized])
+    n_groups = int(np.prod(dims))
+    
+    group_codes = np.full(len(df), -1, dtype=np.int64)
+    group_codes[valid] = np.ravel_multi_index(tuple(codes[valid] for codes, _ in factorized), dims)
+    codes = group_codes[valid]
+    
+    def per_group(values):
+        return np.bincount(codes, weights=values[valid], minlength=n_groups)
+    
+    # Only groups that actually occur (like observed=True)
+    present = np.flatnonzero(np.bincount(codes, minlength=n_groups))
+    present_codes = np.unravel_index(present, dims)
+    index_levels = [uniques.take(c) for (_, uniques), c in zip(factorized, present_codes)]
+    if len(key_cols) == 1:
+        index = index_levels[0].rename(key_cols[0])
+    else:
+        index = pd.MultiIndex.from_arrays(index_levels, names=key_cols)
+    
+    games = per_group(df['game_id'].notna().to_numpy())[present].astype('int64')
+    
+    result_codes = _result_codes(df['result'])
+    tallies = np.column_stack([
+        per_group(result_codes == code) for code in RESULT_CODES.values()
+    ])[present].astype('int64')
+    
+    # Mean rating over games that have one
+    rating = pd.to_numeric(df['user_rating'], errors='coerce').to_numpy(dtype=np.float64)
+    has_rating = ~np.isnan(rating)
+    rating_sum = per_group(np.where(has_rating, rating, 0.0))[present]
+    rating_count = per_group(has_rating)[present]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_rating = rating_sum / rating_count
+    
+    # Take the first ECO code associated with this opening name (first non-missing in game order)
+    eco = df['eco']
+    eco_rows = np.flatnonzero(valid & eco.notna().to_numpy())
+    eco_groups, first = np.unique(group_codes[eco_rows], return_index=True)
+    eco_pos = eco_rows[first]
+    
+    columns = {
+        'games': games,
+        'wins': tallies[:, 0],
+        'draws': tallies[:, 1],
+        'losses': tallies[:, 2],
+        'avg_rating': avg_rating,
+        'eco': pd.Series(eco.iloc[eco_pos].array, index=eco_groups).reindex(present).array
+    }
+    return pd.DataFrame(columns, index=index)
+
+def _finalize_opening_stats(stats):
+    """Add win rate and sort by most played openings (ties keep their group order)."""
+    stats['win_rate'] = stats['wins'] / stats['games']
+    stats.sort_values('games', ascending=False, kind='stable', inplace=True)
+    return stats
+
 def get_opening_stats(df, color=None):
     """
     Calculate aggregate statistics for each opening played.
@@ -150,24 +408,131 @@ def get_opening_stats(df, color=None):
         return pd.DataFrame()
 
     # Group by opening name and aggregate results
-    stats = df.groupby('opening_name').agg(
-        games=('game_id', 'count'),
-        wins=('result', lambda x: (x == 'Win').sum()),
-        draws=('result', lambda x: (x == 'Draw').sum()),
-        losses=('result', lambda x: (x == 'Loss').sum()),
-        avg_rating=('user_rating', 'mean'),
-        eco=('eco', 'first')  # Take the first ECO code associated with this opening name
-    ).reset_index()
-    
-    # Calculate Win Rate
-    stats['win_rate'] = stats['wins'] / stats['games']
+    stats = _aggregate_openings(df, 'opening_name').reset_index()
+    
+    return _finalize_opening_stats(stats)
+
+def get_opening_stats_by_color(df):
+    """
+    Calculate opening statistics for White and Black games from one aggregation.
     
-    # Sort by most played openings
-    stats = stats.sort_values('games', ascending=False)
+    Games are aggregated once per (color, opening) with _aggregate_openings and
+    the result is split by color. Equivalent to calling
+    get_opening_stats(df, color='white') and get_opening_stats(df, color='black'),
+    without copying the DataFrame per color.
     
-    return stats
+    Args:
+        df (pd.DataFrame): The processed games DataFrame.
+        
+    Returns:
+        tuple: (white_stats, black_stats) DataFrames with the same columns as get_opening_stats.
+    """
+    if df.empty:
+        return pd.DataFrame(), pd.DataFrame()
+        
+    combined = _aggregate_openings(df, ['user_color', 'opening_name'])
+    played_colors = set(combined.index.get_level_values('user_color'))
+    
+    results = []
+    for color in ('white', 'black'):
+        if color in played_colors:
+            stats = combined.xs(color, level='user_color').reset_index()
+            results.append(_finalize_opening_stats(stats))
+        else:
+            results.append(pd.DataFrame())
+    
+    return results[0], results[1]
 
-def calculate_risk_metrics(df):
+def get_opening_stats_all(df):
+    """
+    Calculate overall, White and Black opening statistics in one call.
+    
+    Runs two aggregations over the games: one per opening for the overall table
+    and one per (color, opening) for the color tables. Building the overall table
+    directly is cheaper than rolling it up from the per-color one.
+    
+    Args:
+        df (pd.DataFrame): The processed games DataFrame.
+        
+    Returns:
+        tuple: (opening_stats, white_stats, black_stats), the same tables as
+        get_opening_stats(df) and get_opening_stats_by_color(df).
+    """
+    if df.empty:
+        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+        
+    return (get_opening_stats(df),) + get_opening_stats_by_color(df)
+
+# Risk archetype per integer risk score (1-10)
+RISK_PROFILES = {
+    1: {
+        "label": "The Wall 🧱",
+        "feedback": "You are incredibly hard to beat. You take zero risks.",
+        "improvement": "You might be missing wins by being too passive. Try to complicate the game when you have an advantage."
+    },
+    2: {
+        "label": "Safety First 🛡️",
+        "feedback": "You prioritize safety above all else. You rarely blunder.",
+        "improvement": "Don't be afraid of ghosts. Sometimes the sharpest move is the safest path to victory."
+    },
+    3: {
+        "label": "Cautious Player 🔒",
+        "feedback": "You prefer solid, positional games. You avoid complications.",
+        "improvement": "Work on your tactical vision. You need to be able to calculate sharp lines when forced."
+    },
+    4: {
+        "label": "Solid & Steady 🗿",
+        "feedback": "You play sound chess. You don't give away free gifts.",
+        "improvement": "Expand your opening repertoire to include some semi-open games to practice dynamic play."
+    },
+    5: {
+        "label": "Balanced ⚖️",
+        "feedback": "You have a perfect mix of solid play and aggression.",
+        "improvement": "Maintain this balance. Focus on deep strategic understanding to improve further."
+    },
+    6: {
+        "label": "Calculated Risk 📐",
+        "feedback": "You are willing to take risks, but only when you've calculated them.",
+        "improvement": "Trust your intuition in complex positions where you can't calculate everything."
+    },
+    7: {
+        "label": "Aggressive ⚔️",
+        "feedback": "You actively look for attacking chances. You put pressure on opponents.",
+        "improvement": "Ensure your attacks are sound. Don't attack just for the sake of attacking."
+    },
+    8: {
+        "label": "Attacker 🏹",
+        "feedback": "You are always moving forward. You hate defending.",
+        "improvement": "Learn to defend! Sometimes the best way to win is to weather the storm and counter-attack."
+    },
+    9: {
+        "label": "Daredevil 🧨",
+        "feedback": "You live on the edge. You sacrifice material for initiative frequently.",
+        "improvement": "Calm down. Not every position requires a sacrifice. Learn to play quiet moves."
+    },
+    10: {
+        "label": "Chaos Agent 🌪️",
+        "feedback": "You want the board to burn. Win or lose, it will be spectacular.",
+        "improvement": "You are gambling, not playing chess. Focus on 'prophylaxis' and king safety."
+    }
+}
+
+def summarize_games(df):
+    """
+    Count results and average the ply count (shared by the risk and pacing metrics).
+    
+    Compute it once and pass it as `summary` to both metric functions when they
+    run on the same DataFrame.
+    
+    Returns:
+        tuple: (result_counts, avg_ply); result_counts is indexed by RESULT_CODES.
+    """
+    # One counting pass over the int result codes (unknown results don't count)
+    codes = _result_codes(df['result'])
+    result_counts = np.bincount(codes[codes >= 0], minlength=len(RESULT_CODES))
+    return result_counts, df['ply_count'].mean()
+
+def calculate_risk_metrics(df, summary=None):
     """
     Calculate a 'Risk/Aggressiveness' score (1-10) based on game data.
     
@@ -175,6 +540,10 @@ def calculate_risk_metrics(df):
     - Low Draw Rate = Higher Risk
     - Short Game Length = Higher Risk
     
+    Args:
+        df (pd.DataFrame): Filtered dataframe.
+        summary (tuple, optional): summarize_games(df), if already computed.
+        
     Returns:
         dict: {
             'score': float (1-10),
@@ -198,9 +567,8 @@ def calculate_risk_metrics(df):
     # Online chess has fewer draws. We calibrate so ~10% draw rate is "Balanced" (Score 5).
     # >20% draw rate -> Score 0 (Solid)
     # <2% draw rate -> Score 9-10 (Berserker)
-    total_games = len(df)
-    draws = len(df[df['result'] == 'Draw'])
-    draw_rate = draws / total_games if total_games > 0 else 0
+    result_counts, avg_ply = summary if summary is not None else summarize_games(df)
+    draw_rate = float(result_counts[RESULT_CODES['Draw']]) / len(df)
     
     # Formula: (1 - (draw_rate * 5)) * 10. Clamped 0-10.
     draw_factor = max(0, (1 - (draw_rate * 5))) * 10
@@ -208,7 +576,6 @@ def calculate_risk_metrics(df):
     # 2. Game Length Factor (0-10)
     # Avg 20 moves -> Score 10 (Quick kills/deaths)
     # Avg 60 moves -> Score 0 (Long grinds)
-    avg_ply = df['ply_count'].mean()
     avg_moves = avg_ply / 2
     
     # Formula: (60 - avg_moves) / 4. Clamped 0-10.
@@ -221,61 +588,7 @@ def calculate_risk_metrics(df):
     # Determine Label and Feedback
     # Determine Label and Feedback based on 1-10 Score
     int_score = int(risk_score)
-    
-    risk_profiles = {
-        1: {
-            "label": "The Wall 🧱",
-            "feedback": "You are incredibly hard to beat. You take zero risks.",
-            "improvement": "You might be missing wins by being too passive. Try to complicate the game when you have an advantage."
-        },
-        2: {
-            "label": "Safety First 🛡️",
-            "feedback": "You prioritize safety above all else. You rarely blunder.",
-            "improvement": "Don't be afraid of ghosts. Sometimes the sharpest move is the safest path to victory."
-        },
-        3: {
-            "label": "Cautious Player 🔒",
-            "feedback": "You prefer solid, positional games. You avoid complications.",
-            "improvement": "Work on your tactical vision. You need to be able to calculate sharp lines when forced."
-        },
-        4: {
-            "label": "Solid & Steady 🗿",
-            "feedback": "You play sound chess. You don't give away free gifts.",
-            "improvement": "Expand your opening repertoire to include some semi-open games to practice dynamic play."
-        },
-        5: {
-            "label": "Balanced ⚖️",
-            "feedback": "You have a perfect mix of solid play and aggression.",
-            "improvement": "Maintain this balance. Focus on deep strategic understanding to improve further."
-        },
-        6: {
-            "label": "Calculated Risk 📐",
-            "feedback": "You are willing to take risks, but only when you've calculated them.",
-            "improvement": "Trust your intuition in complex positions where you can't calculate everything."
-        },
-        7: {
-            "label": "Aggressive ⚔️",
-            "feedback": "You actively look for attacking chances. You put pressure on opponents.",
-            "improvement": "Ensure your attacks are sound. Don't attack just for the sake of attacking."
-        },
-        8: {
-            "label": "Attacker 🏹",
-            "feedback": "You are always moving forward. You hate defending.",
-            "improvement": "Learn to defend! Sometimes the best way to win is to weather the storm and counter-attack."
-        },
-        9: {
-            "label": "Daredevil 🧨",
-            "feedback": "You live on the edge. You sacrifice material for initiative frequently.",
-            "improvement": "Calm down. Not every position requires a sacrifice. Learn to play quiet moves."
-        },
-        10: {
-            "label": "Chaos Agent 🌪️",
-            "feedback": "You want the board to burn. Win or lose, it will be spectacular.",
-            "improvement": "You are gambling, not playing chess. Focus on 'prophylaxis' and king safety."
-        }
-    }
-    
-    profile = risk_profiles.get(int_score, risk_profiles[5])
+    profile = RISK_PROFILES.get(int_score, RISK_PROFILES[5])
     label = profile['label']
     feedback = profile['feedback']
     improvement = profile['improvement']
@@ -292,13 +605,99 @@ def calculate_risk_metrics(df):
         'explanation': explanation
     }
 
-def calculate_pacing_metrics(df, time_control):
+# Target average game length (moves) per time control, i.e. a pacing score of 5.5
+PACING_TARGETS = {
+    'bullet': 30,
+    'blitz': 35,
+    'rapid': 40,
+    'classical': 45,
+    'overall': 35
+}
+
+# Pacing archetypes: one (high win rate, low win rate) pair per pacing-score tier.
+# PACING_TIER_BOUNDS holds each tier's upper score; feedback strings take {avg_moves}.
+PACING_TIER_BOUNDS = (2, 4, 6, 8)
+PACING_ARCHETYPES = [
+    (  # Extremely Fast (1-2)
+        {
+            "label": "Intuitive Genius ⚡",
+            "color": "#00E676", # Bright Green
+            "feedback": "Avg {avg_moves} moves. You play instantly and crush opponents. Your intuition is terrifying.",
+            "improvement": "You are a natural talent. Study complex tactical patterns to sharpen your greatest weapon."
+        },
+        {
+            "label": "Suicidal Sprinter 🧨",
+            "color": "#D50000", # Deep Red
+            "feedback": "Avg {avg_moves} moves. You play way too fast and lose. You are essentially gambling.",
+            "improvement": "Stop! Sit on your hands. Force yourself to check for blunders before every single move."
+        }
+    ),
+    (  # Fast (3-4)
+        {
+            "label": "Sharp Shooter 🔫",
+            "color": "#66BB6A", # Light Green
+            "feedback": "Avg {avg_moves} moves. You play aggressively and it pays off. You put pressure on opponents.",
+            "improvement": "Maintain this energy. Ensure your opening repertoire supports this aggressive style."
+        },
+        {
+            "label": "Impulsive Mover 🐇",
+            "color": "#FF5252", # Red-Orange
+            "feedback": "Avg {avg_moves} moves. You move a bit too quickly in critical moments, missing chances.",
+            "improvement": "Slow down only when the position is complex. Learn to recognize 'critical moments'."
+        }
+    ),
+    (  # Average (5-6)
+        {
+            "label": "Balanced Pacer ⚖️",
+            "color": "#29B6F6", # Light Blue
+            "feedback": "Avg {avg_moves} moves. Your pacing is perfect. You manage your time well.",
+            "improvement": "You have a solid foundation. Focus on deep strategic understanding to improve further."
+        },
+        {
+            "label": "Drifting Aimlessly 🍂",
+            "color": "#FFA726", # Orange
+            "feedback": "Avg {avg_moves} moves. Your pace is normal, but you aren't winning enough. You might be lacking a plan.",
+            "improvement": "Work on 'planning'. Don't just make moves; have a clear goal for every stage of the game."
+        }
+    ),
+    (  # Slow (7-8)
+        {
+            "label": "Deep Thinker 🧠",
+            "color": "#42A5F5", # Blue
+            "feedback": "Avg {avg_moves} moves. You take your time and find good moves. Your calculation is an asset.",
+            "improvement": "Keep calculating, but practice 'pattern recognition' to speed up simple decisions."
+        },
+        {
+            "label": "Time Trouble Addict ⏳",
+            "color": "#FF7043", # Orange-Red
+            "feedback": "Avg {avg_moves} moves. You think too long and likely blunder in time pressure.",
+            "improvement": "Trust your gut on simple moves. Save your time for the complicated positions."
+        }
+    ),
+    (  # Extremely Slow (9-10)
+        {
+            "label": "Grind Master 🐢",
+            "color": "#1E88E5", # Dark Blue
+            "feedback": "Avg {avg_moves} moves. You torture opponents in long endgames. You have immense patience.",
+            "improvement": "Your endgame technique is key. Study 'endgame studies' to perfect your grinding skills."
+        },
+        {
+            "label": "Paralysis by Analysis 🧊",
+            "color": "#B71C1C", # Dark Red
+            "feedback": "Avg {avg_moves} moves. You freeze up and overthink everything. You are your own worst enemy.",
+            "improvement": "Set a strict time limit per move in your head. A 'good' move now is better than a 'perfect' move when your flag falls."
+        }
+    )
+]
+
+def calculate_pacing_metrics(df, time_control, summary=None):
     """
     Calculate a 'Pacing' score (Fast/Slow/Right) based on avg game length and Time Control.
     
     Args:
         df (pd.DataFrame): Filtered dataframe.
         time_control (str): 'rapid', 'blitz', 'bullet', 'classical', or 'overall'.
+        summary (tuple, optional): summarize_games(df), if already computed.
         
     Returns:
         dict: { 'label': str, 'color': str, 'avg_moves': int, 'feedback': str }
@@ -306,25 +705,18 @@ def calculate_pacing_metrics(df, time_control):
     if df.empty:
         return {'label': "N/A", 'color': "gray", 'avg_moves': 0, 'feedback': "No data."}
         
-    avg_ply = df['ply_count'].mean()
+    result_counts, avg_ply = summary if summary is not None else summarize_games(df)
     avg_moves = int(avg_ply / 2)
     
     # Calculate Win Rate for Context
-    wins = len(df[df['result'] == 'Win'])
+    wins = int(result_counts[RESULT_CODES['Win']])
     total = len(df)
     win_rate = wins / total if total > 0 else 0
     
     tc = time_control.lower()
     
     # Target Moves for "Average" Pacing (Score 5.5)
-    targets = {
-        'bullet': 30,
-        'blitz': 35,
-        'rapid': 40,
-        'classical': 45,
-        'overall': 35
-    }
-    target = targets.get(tc, 35)
+    target = PACING_TARGETS.get(tc, 35)
     
     # Calculate Pacing Score (1-10)
     # 1 = Extremely Fast, 10 = Extremely Slow
@@ -338,65 +730,13 @@ def calculate_pacing_metrics(df, time_control):
     # High Win Rate threshold
     high_wr = 0.55
     
-    if pacing_score <= 2: # Extremely Fast
-        if win_rate > high_wr:
-            label = "Intuitive Genius ⚡"
-            color = "#00E676" # Bright Green
-            feedback = f"Avg {avg_moves} moves. You play instantly and crush opponents. Your intuition is terrifying."
-            improvement = "You are a natural talent. Study complex tactical patterns to sharpen your greatest weapon."
-        else:
-            label = "Suicidal Sprinter 🧨"
-            color = "#D50000" # Deep Red
-            feedback = f"Avg {avg_moves} moves. You play way too fast and lose. You are essentially gambling."
-            improvement = "Stop! Sit on your hands. Force yourself to check for blunders before every single move."
-            
-    elif pacing_score <= 4: # Fast
-        if win_rate > high_wr:
-            label = "Sharp Shooter 🔫"
-            color = "#66BB6A" # Light Green
-            feedback = f"Avg {avg_moves} moves. You play aggressively and it pays off. You put pressure on opponents."
-            improvement = "Maintain this energy. Ensure your opening repertoire supports this aggressive style."
-        else:
-            label = "Impulsive Mover 🐇"
-            color = "#FF5252" # Red-Orange
-            feedback = f"Avg {avg_moves} moves. You move a bit too quickly in critical moments, missing chances."
-            improvement = "Slow down only when the position is complex. Learn to recognize 'critical moments'."
-            
-    elif pacing_score <= 6: # Average
-        if win_rate > high_wr:
-            label = "Balanced Pacer ⚖️"
-            color = "#29B6F6" # Light Blue
-            feedback = f"Avg {avg_moves} moves. Your pacing is perfect. You manage your time well."
-            improvement = "You have a solid foundation. Focus on deep strategic understanding to improve further."
-        else:
-            label = "Drifting Aimlessly 🍂"
-            color = "#FFA726" # Orange
-            feedback = f"Avg {avg_moves} moves. Your pace is normal, but you aren't winning enough. You might be lacking a plan."
-            improvement = "Work on 'planning'. Don't just make moves; have a clear goal for every stage of the game."
-            
-    elif pacing_score <= 8: # Slow
-        if win_rate > high_wr:
-            label = "Deep Thinker 🧠"
-            color = "#42A5F5" # Blue
-            feedback = f"Avg {avg_moves} moves. You take your time and find good moves. Your calculation is an asset."
-            improvement = "Keep calculating, but practice 'pattern recognition' to speed up simple decisions."
-        else:
-            label = "Time Trouble Addict ⏳"
-            color = "#FF7043" # Orange-Red
-            feedback = f"Avg {avg_moves} moves. You think too long and likely blunder in time pressure."
-            improvement = "Trust your gut on simple moves. Save your time for the complicated positions."
-            
-    else: # Extremely Slow (9-10)
-        if win_rate > high_wr:
-            label = "Grind Master 🐢"
-            color = "#1E88E5" # Dark Blue
-            feedback = f"Avg {avg_moves} moves. You torture opponents in long endgames. You have immense patience."
-            improvement = "Your endgame technique is key. Study 'endgame studies' to perfect your grinding skills."
-        else:
-            label = "Paralysis by Analysis 🧊"
-            color = "#B71C1C" # Dark Red
-            feedback = f"Avg {avg_moves} moves. You freeze up and overthink everything. You are your own worst enemy."
-            improvement = "Set a strict time limit per move in your head. A 'good' move now is better than a 'perfect' move when your flag falls."
+    # Pick the score tier with a bisect over the tier bounds, then the archetype by win rate
+    tier = bisect_left(PACING_TIER_BOUNDS, pacing_score)
+    archetype = PACING_ARCHETYPES[tier][0 if win_rate > high_wr else 1]
+    label = archetype['label']
+    color = archetype['color']
+    feedback = archetype['feedback'].format(avg_moves=avg_moves)
+    improvement = archetype['improvement']
 
     return {
         'label': label,
@@ -407,9 +747,152 @@ def calculate_pacing_metrics(df, time_control):
         'score': pacing_score # Added raw score for Radar Chart
     }
 
-import chess
-import chess.pgn
-import io
+# Phase codes for the per-move times in calculate_time_stats
+MOVE_PHASES = {'Opening': 0, 'Middlegame': 1, 'Endgame': 2}
+
+# Target seconds per move (low, high) by time control and phase
+TIME_TARGETS = {
+    'bullet': {'open': (0.5, 2), 'mid': (0.5, 3), 'end': (0.5, 3)},
+    'blitz': {'open': (2, 5), 'mid': (3, 8), 'end': (3, 10)},
+    'rapid': {'open': (5, 10), 'mid': (8, 20), 'end': (8, 25)},
+    'classical': {'open': (10, 30), 'mid': (20, 60), 'end': (20, 90)},
+    'overall': {'open': (5, 15), 'mid': (10, 30), 'end': (10, 40)}
+}
+
+# Advice per game phase and pace ('fast' / 'slow' / 'good') for the time-management feedback
+TIME_PHASE_ADVICE = {
+    'Opening': {
+        'fast': {'reason': "Rushing openings leads to poor structures.", 'tip': "Check for tactical refutations before moving."},
+        'slow': {'reason': "Over-thinking theory wastes clock.", 'tip': "Trust your prep and develop pieces naturally."},
+        'good': {'reason': "You are balancing development and caution well.", 'tip': "Maintain this rhythm."}
+    },
+    'Middlegame': {
+        'fast': {'reason': "Speed here causes tactical blunders.", 'tip': "Calculate at least 2 candidate moves in complex positions."},
+        'slow': {'reason': "Time trouble will ruin your endgame.", 'tip': "Don't calculate everything; rely on patterns."},
+        'good': {'reason': "You are allocating time correctly for calculations.", 'tip': "Keep looking for critical moments."}
+    },
+    'Endgame': {
+        'fast': {'reason': "Endgames require precision, not speed.", 'tip': "Count tempos and calculate pawn races carefully."},
+        'slow': {'reason': "You risk flagging in winning positions.", 'tip': "If it's theoretical, play confidently."},
+        'good': {'reason': "You are navigating the technical phase well.", 'tip': "Stay alert for stalemate tricks."}
+    }
+}
+
+def _replay_queen_presence(moves):
+    """Whether any queen is left after each ply, by replaying the moves on a board."""
+    import chess
+    board = chess.Board()
+    present = []
+    for move_san in moves:
+        try:
+            board.push_san(move_san)
+        except ValueError:
+            break
+        present.append(bool(board.queens)) # Bitboard of both sides' queens
+    return present
+
+def _queen_presence(moves):
+    """
+    Whether any queen is left after each ply, read from the SAN text alone.
+    
+    A queen only leaves the board when something captures on its square and only
+    appears by promotion, so following the queens' squares is enough. A queen move
+    that can't be matched to exactly one queen falls back to a full board replay.
+    """
+    import chess
+    queens = {'d8': chess.BLACK, 'd1': chess.WHITE} # square -> color
+    present = []
+    for i, move_san in enumerate(moves):
+        if not move_san.startswith('O'):
+            move = move_san.rstrip('+#')
+            move, _, promotion = move.partition('=')
+            if len(move) < 2:
+                return _replay_queen_presence(moves)
+            target = move[-2:]
+            color = chess.WHITE if i % 2 == 0 else chess.BLACK
+            
+            if 'x' in move:
+                queens.pop(target, None)
+            if move[0] == 'Q':
+                own = [square for square, c in queens.items() if c == color]
+                if len(own) != 1:
+                    return _replay_queen_presence(moves)
+                del queens[own[0]]
+                queens[target] = color
+            if promotion == 'Q':
+                queens[target] = color
+                
+        present.append(bool(queens))
+    return present
+
+@lru_cache(maxsize=20000)
+def _queen_presence_cached(moves_str, n_plies):
+    """
+    _queen_presence for the first n_plies of a move string, as a read-only bool array.
+    
+    Memoized on the move text: the same games are re-timed on every rerun and
+    time-control switch, and their moves never change.
+    """
+    present = np.array(_queen_presence(moves_str.split()[:n_plies]), dtype=bool)
+    present.flags.writeable = False
+    return present
+
+def _collect_move_times(games, username):
+    """
+    Time spent on each of the user's moves, with the game phase of each move.
+    
+    Expects only games that have both clock data and moves.
+    
+    Returns:
+        tuple: (times, phases) arrays in game order; phases holds MOVE_PHASES codes.
+    """
+    import chess
+    username_lower = username.lower()
+    
+    # One array per game, joined once at the end (no per-move list appends)
+    game_times = []
+    game_phases = []
+    
+    for game in games:
+        # Determine user color and index (White=0, Black=1)
+        players = game.get('players') or _EMPTY
+        white_user = players.get('white', _EMPTY).get('user', _EMPTY).get('name')
+        
+        if not white_user:
+            white_user = game.get('white_user', 'Unknown')
+            
+        user_color = chess.WHITE if white_user.lower() == username_lower else chess.BLACK
+        user_index = 0 if user_color == chess.WHITE else 1
+        
+        # Get clocks (centiseconds)
+        clocks = game['clocks']
+            
+        # Get increment (seconds)
+        clock_settings = game.get('clock', _EMPTY)
+        increment = clock_settings.get('increment', 0)
+        
+        # Parse moves to track board state
+        moves_str = game['moves']
+            
+        # Whether any queen is left after each ply (only as far as there are clock readings)
+        queens_on_board = _queen_presence_cached(moves_str, max(len(clocks) - 2, 0))
+            
+        # User plies that have a clock reading two plies later
+        plies = np.arange(user_index, min(len(queens_on_board), len(clocks) - 2), 2)
+        if plies.size == 0:
+            continue
+            
+        clocks = np.asarray(clocks)
+        game_times.append(np.maximum((clocks[plies] - clocks[plies + 2]) / 100 + increment, 0))
+        
+        # Moves 1-10 are the opening; after that it depends on the queens
+        has_queens = queens_on_board[plies]
+        game_phases.append(np.where(plies < 20, MOVE_PHASES['Opening'],
+                                    np.where(has_queens, MOVE_PHASES['Middlegame'], MOVE_PHASES['Endgame'])).astype(np.int8))
+
+    if not game_times:
+        return np.empty(0), np.empty(0, dtype=np.int8)
+    return np.concatenate(game_times), np.concatenate(game_phases)
 
 def calculate_time_stats(games, username, time_control="overall", pacing_label="N/A"):
     """
@@ -434,113 +917,34 @@ def calculate_time_stats(games, username, time_control="overall", pacing_label="
             'raw_times': list # Added for Histogram
         }
     """
-    opening_times = []
-    middlegame_times = []
-    endgame_times = []
-    all_times = [] # For Histogram
-    
-    for game in games:
-        # Skip if no clock data
-        if 'clocks' not in game:
-            continue
-            
-        # Determine user color and index (White=0, Black=1)
-        players = game.get('players') or {}
-        white_user = players.get('white', {}).get('user', {}).get('name')
-        
-        if not white_user:
-            white_user = game.get('white_user', 'Unknown')
-            
-        user_color = chess.WHITE if white_user.lower() == username.lower() else chess.BLACK
-        user_index = 0 if user_color == chess.WHITE else 1
-        
-        # Get clocks (centiseconds)
-        clocks = game.get('clocks', [])
-        if not clocks:
-            continue
-            
-        # Get increment (seconds)
-        clock_settings = game.get('clock', {})
-        increment = clock_settings.get('increment', 0)
-        
-        # Parse moves to track board state
-        moves_str = game.get('moves', '')
-        if not moves_str:
-            continue
-            
-        board = chess.Board()
-        moves = moves_str.split()
-        
-        for i, move_san in enumerate(moves):
-            try:
-                board.push_san(move_san)
-            except ValueError:
-                break
-                
-            is_user_move = (i % 2 == 0) if user_color == chess.WHITE else (i % 2 != 0)
-            
-            if is_user_move:
-                if i + 2 >= len(clocks):
-                    break
-                    
-                time_spent = (clocks[i] - clocks[i+2]) / 100 + increment
-                time_spent = max(0, time_spent)
-                all_times.append(time_spent)
-                
-                move_num = (i // 2) + 1
-                
-                if move_num <= 10:
-                    opening_times.append(time_spent)
-                else:
-                    queens_on_board = len(board.pieces(chess.QUEEN, chess.WHITE)) + len(board.pieces(chess.QUEEN, chess.BLACK))
-                    if queens_on_board > 0:
-                        middlegame_times.append(time_spent)
-                    else:
-                        endgame_times.append(time_spent)
-
-    def safe_avg(lst):
-        return round(sum(lst) / len(lst), 1) if lst else 0
-
-    op_avg = safe_avg(opening_times)
-    mid_avg = safe_avg(middlegame_times)
-    end_avg = safe_avg(endgame_times)
+    # Only games with clock data and moves can be timed; filter them once up front
+    games = [game for game in games if game.get('clocks') and game.get('moves')]
+    times, phases = _collect_move_times(games, username)
+
+    def safe_avg(phase):
+        phase_times = times[phases == MOVE_PHASES[phase]]
+        return round(float(phase_times.mean()), 1) if phase_times.size else 0
+
+    op_avg = safe_avg('Opening')
+    mid_avg = safe_avg('Middlegame')
+    end_avg = safe_avg('Endgame')
     
     # --- Generate Feedback with Pacing Synergy ---
     
-    # Helper to generate phase feedback
     # Helper to generate phase feedback
     def get_feedback(phase, avg_time, target_range, pacing_label):
         low, high = target_range
         
-        # Rich Advice Dictionary
-        phase_advice = {
-            'Opening': {
-                'fast': {'reason': "Rushing openings leads to poor structures.", 'tip': "Check for tactical refutations before moving."},
-                'slow': {'reason': "Over-thinking theory wastes clock.", 'tip': "Trust your prep and develop pieces naturally."},
-                'good': {'reason': "You are balancing development and caution well.", 'tip': "Maintain this rhythm."}
-            },
-            'Middlegame': {
-                'fast': {'reason': "Speed here causes tactical blunders.", 'tip': "Calculate at least 2 candidate moves in complex positions."},
-                'slow': {'reason': "Time trouble will ruin your endgame.", 'tip': "Don't calculate everything; rely on patterns."},
-                'good': {'reason': "You are allocating time correctly for calculations.", 'tip': "Keep looking for critical moments."}
-            },
-            'Endgame': {
-                'fast': {'reason': "Endgames require precision, not speed.", 'tip': "Count tempos and calculate pawn races carefully."},
-                'slow': {'reason': "You risk flagging in winning positions.", 'tip': "If it's theoretical, play confidently."},
-                'good': {'reason': "You are navigating the technical phase well.", 'tip': "Stay alert for stalemate tricks."}
-            }
-        }
-        
         # Base Feedback
         if avg_time < low:
             status = "Too Fast"
-            base = phase_advice[phase]['fast']
+            base = TIME_PHASE_ADVICE[phase]['fast']
         elif avg_time > high:
             status = "Too Slow"
-            base = phase_advice[phase]['slow']
+            base = TIME_PHASE_ADVICE[phase]['slow']
         else:
             status = "On Target"
-            base = phase_advice[phase]['good']
+            base = TIME_PHASE_ADVICE[phase]['good']
             
         reason = base['reason']
         tip = base['tip']
@@ -562,15 +966,8 @@ def calculate_time_stats(games, username, time_control="overall", pacing_label="
                 
         return f"**{status}**\n\nReason: {reason}\n\nTip: {tip}\n\nTarget: {low}-{high}s"
 
-    # Define Targets based on TC
-    targets = {
-        'bullet': {'open': (0.5, 2), 'mid': (0.5, 3), 'end': (0.5, 3)},
-        'blitz': {'open': (2, 5), 'mid': (3, 8), 'end': (3, 10)},
-        'rapid': {'open': (5, 10), 'mid': (8, 20), 'end': (8, 25)},
-        'classical': {'open': (10, 30), 'mid': (20, 60), 'end': (20, 90)},
-        'overall': {'open': (5, 15), 'mid': (10, 30), 'end': (10, 40)}
-    }
-    t = targets.get(time_control.lower(), targets['overall'])
+    # Targets based on TC
+    t = TIME_TARGETS.get(time_control.lower(), TIME_TARGETS['overall'])
     
     return {
         'opening_avg': op_avg,
@@ -581,7 +978,7 @@ def calculate_time_stats(games, username, time_control="overall", pacing_label="
         
         'endgame_avg': end_avg,
         'endgame_feedback': get_feedback("Endgame", end_avg, t['end'], pacing_label),
-        'raw_times': all_times # Added for Histogram
+        'raw_times': times.tolist() # Added for Histogram
     }
 
 def get_synergized_advice(phase, score, pacing_label):
@@ -679,51 +1076,100 @@ def get_synergized_advice(phase, score, pacing_label):
             
     return advice
 
+# Phase score per average centipawn loss: below 15 scores 10, 110 and above scores 1
+PHASE_SCORE_BOUNDS = (15, 25, 35, 45, 55, 65, 75, 90, 110)
+
+def _entry_eval(entry):
+    """The 'eval' of one analysis entry, or None if it can't be scored (not a dict, not a number)."""
+    try:
+        value = entry.get('eval', 0)
+    except AttributeError:
+        return None
+    return value if isinstance(value, (int, float, np.number)) else None
+
+def _user_move_losses(analysis, user_index, n_plies):
+    """
+    Centipawn loss of each of the user's moves in one game, capped at 1000.
+    
+    A move is skipped when its analysis entry, or the one before it, can't be scored.
+    
+    Args:
+        analysis (list): Lichess analysis entries (White-perspective 'eval' per ply).
+        user_index (int): 0 if the user is White, 1 if Black.
+        n_plies (int): Number of plies to score.
+        
+    Returns:
+        tuple: (plies, losses) arrays for the user's scored plies (user_index, user_index + 2, ...).
+    """
+    entries = analysis[:n_plies]
+    try:
+        # Mate entries carry no 'eval' and count as 0, as before
+        evals = np.array([entry.get('eval', 0) for entry in entries])
+    except (AttributeError, ValueError):
+        evals = None
+    plies = np.arange(user_index, n_plies, 2)
+    if evals is not None and evals.ndim == 1 and evals.dtype.kind in 'iuf':
+        evals = evals.astype(np.float64)
+    else:
+        # Some entries are malformed: score around them entry by entry
+        values = [_entry_eval(entry) for entry in entries]
+        valid = np.array([value is not None for value in values], dtype=bool)
+        evals = np.array([value if value is not None else 0 for value in values], dtype=np.float64)
+        valid_before = np.concatenate(([True], valid[:-1]))
+        plies = plies[valid[plies] & valid_before[plies]]
+    
+    # Eval before each ply: the previous ply's, or +20 (White's usual edge) before the first move
+    before = np.concatenate(([20.0], evals[:-1]))
+    
+    # A drop for White is a rise for Black
+    drop = before[plies] - evals[plies]
+    if user_index == 1:
+        drop = -drop
+    # fmax maps NaN evals to no loss, as the scalar comparison did
+    return plies, np.minimum(np.fmax(drop, 0), 1000)
+
 def calculate_analysis_metrics(games, username, pacing_label="Balanced"):
     """
     Calculate accuracy metrics (ACPL, Blunders) and phase breakdown from Lichess analysis data.
     """
+    import chess
     total_acpl = 0
     acpl_count = 0
     total_blunders = 0
     total_mistakes = 0
     total_inaccuracies = 0
     total_moves = 0
-    analyzed_games = 0
     
-    # Phase accumulators: [total_eval_loss, move_count, blunders]
-    phases = {
-        'Opening': {'loss': 0, 'moves': 0, 'blunders': 0},
-        'Middlegame': {'loss': 0, 'moves': 0, 'blunders': 0},
-        'Endgame': {'loss': 0, 'moves': 0, 'blunders': 0}
-    }
+    # Loss and phase (MOVE_PHASES code) of every scored user move, one array per game
+    game_losses = []
+    game_phases = []
     
+    # Only analyzed games contribute; drop the rest before the per-game loop
+    games = [g for g in games if 'analysis' in g]
+    analyzed_games = len(games)
+    
+    username_lower = username.lower()
     for game in games:
-        if 'analysis' not in game:
-            continue
-            
-        analyzed_games += 1
-        
         # Determine user color
         # Robustly handle 'players' dict or fallback to flat fields
-        players = game.get('players') or {}
-        white_user = players.get('white', {}).get('user', {}).get('name')
+        players = game.get('players') or _EMPTY
+        white_user = players.get('white', _EMPTY).get('user', _EMPTY).get('name')
         
         if not white_user:
             white_user = game.get('white_user', 'Unknown')
             
-        user_color = chess.WHITE if white_user.lower() == username.lower() else chess.BLACK
+        user_color = chess.WHITE if white_user.lower() == username_lower else chess.BLACK
         user_color_str = 'white' if user_color == chess.WHITE else 'black'
         
         # Overall Stats from Player Summary
-        player_analysis = players.get(user_color_str, {}).get('analysis', {})
+        player_analysis = players.get(user_color_str, _EMPTY).get('analysis', _EMPTY)
         
         # Fallback to flat analysis fields if nested not found
         if not player_analysis:
             if user_color == chess.WHITE:
-                player_analysis = game.get('white_analysis', {})
+                player_analysis = game.get('white_analysis', _EMPTY)
             else:
-                player_analysis = game.get('black_analysis', {})
+                player_analysis = game.get('black_analysis', _EMPTY)
                 
         if player_analysis:
             # Ensure it's a dict (handle JSON string from DB)
@@ -748,76 +1194,34 @@ def calculate_analysis_metrics(games, username, pacing_label="Balanced"):
         if not analysis or not moves_san:
             continue
             
-        board = chess.Board()
+        # Whether any queen is left after each ply, without replaying the game on a board.
+        # A shorter list means the move after it could not be played; the loop stops there.
+        n_plies = min(len(moves_san), len(analysis))
+        queens_on_board = _queen_presence_cached(game['moves'], n_plies)
         
-        # Initialize game-specific counters
-        game_blunders = 0
-        game_mistakes = 0
-        game_inaccuracies = 0
+        # Plies that were played: all of them, unless the fallback replay rejected a move,
+        # in which case that move is still scored but not counted
+        played_plies = min(n_plies, len(queens_on_board))
+        scored_plies = min(n_plies, played_plies + 1)
+        user_index = 0 if user_color == chess.WHITE else 1
         
-        # Iterate moves and analysis
-        for i, move_san in enumerate(moves_san):
-            if i >= len(analysis):
-                break
-                
-            # Check if it's user's move
-            is_user_move = (i % 2 == 0) if user_color == chess.WHITE else (i % 2 != 0)
-            
-            # Determine Phase
-            move_num = (i // 2) + 1
-            phase = 'Opening'
-            if move_num > 10:
-                queens = len(board.pieces(chess.QUEEN, chess.WHITE)) + len(board.pieces(chess.QUEEN, chess.BLACK))
-                phase = 'Middlegame' if queens > 0 else 'Endgame'
-            
-            current_eval_data = analysis[i]
-            prev_eval_data = analysis[i-1] if i > 0 else {'eval': 20}
-            
-            # Check for Blunder (Judgment)
-            # Lichess analysis sometimes has 'judgment' key in the move stream if explicitly requested or parsed
-            # But standard API 'analysis' list is just evals.
-            # However, we can infer blunders from large eval drops.
-            # Or better: The 'judgment' might be in the analysis stream if we are lucky, but usually it's separate.
-            # Let's use eval drop > 200 as proxy for blunder if judgment missing.
-            
-            is_blunder = False
-            # Try to find judgment in move comment or analysis data? No, simpler to use eval drop.
-            
-            if is_user_move:
-                try:
-                    curr = current_eval_data.get('eval', 0)
-                    prev = prev_eval_data.get('eval', 0)
-                    
-                    loss = 0
-                    if user_color == chess.WHITE:
-                        if curr < prev: loss = prev - curr
-                    else:
-                        if curr > prev: loss = curr - prev
-                            
-                    loss = min(loss, 1000) # Cap at 1000
-                    
-                    # Classify Error
-                    if loss >= 300: # Blunder threshold
-                        phases[phase]['blunders'] += 1
-                        game_blunders += 1
-                        is_blunder = True
-                    elif loss >= 100:
-                        game_mistakes += 1
-                    elif loss >= 50:
-                        game_inaccuracies += 1
-                        
-                    phases[phase]['loss'] += loss
-                    phases[phase]['moves'] += 1
-                    
-                except Exception:
-                    pass
-            
-            try:
-                board.push_san(move_san)
-            except:
-                break
-                
-            total_moves += 1 if is_user_move else 0
+        # Blunders are inferred from eval drops: the standard API 'analysis' list is just
+        # evals, without the per-move judgments
+        plies, losses = _user_move_losses(analysis, user_index, scored_plies)
+        
+        # Moves 1-10 are the opening; after that it depends on the queens before the move
+        has_queens = np.concatenate(([True], queens_on_board))[plies] # Queens before each ply
+        game_losses.append(losses)
+        game_phases.append(np.where(plies < 20, MOVE_PHASES['Opening'],
+                                    np.where(has_queens, MOVE_PHASES['Middlegame'], MOVE_PHASES['Endgame'])))
+        
+        # Classify Error
+        game_blunders = int(np.count_nonzero(losses >= 300)) # Blunder threshold
+        game_mistakes = int(np.count_nonzero((losses >= 100) & (losses < 300)))
+        game_inaccuracies = int(np.count_nonzero((losses >= 50) & (losses < 100)))
+        
+        # User moves actually played on the board
+        total_moves += len(range(user_index, played_plies, 2))
 
         # Update Totals (Use manual counts if API data missing)
         if player_analysis and player_analysis.get('blunder') is not None:
@@ -832,19 +1236,26 @@ def calculate_analysis_metrics(games, username, pacing_label="Balanced"):
     if acpl_count == 0:
         return None
         
+    # Phase totals: eval loss, move count and blunders per phase
+    if game_losses:
+        losses = np.concatenate(game_losses)
+        move_phases = np.concatenate(game_phases).astype(np.intp)
+    else:
+        losses = np.empty(0)
+        move_phases = np.empty(0, dtype=np.intp)
+    phase_loss = np.bincount(move_phases, weights=losses, minlength=3)
+    phase_moves = np.bincount(move_phases, minlength=3)
+    phase_blunders = np.bincount(move_phases[losses >= 300], minlength=3)
+    phases = {
+        phase: {'loss': float(phase_loss[code]), 'moves': int(phase_moves[code]), 'blunders': int(phase_blunders[code])}
+        for phase, code in MOVE_PHASES.items()
+    }
+        
     # Calculate Phase Scores (1-10)
     def get_score(avg_loss):
         if avg_loss == 0: return 0
-        if avg_loss < 15: return 10
-        if avg_loss < 25: return 9
-        if avg_loss < 35: return 8
-        if avg_loss < 45: return 7
-        if avg_loss < 55: return 6
-        if avg_loss < 65: return 5
-        if avg_loss < 75: return 4
-        if avg_loss < 90: return 3
-        if avg_loss < 110: return 2
-        return 1
+        # Each bound the average loss reaches costs one point off a perfect 10
+        return 10 - bisect_right(PHASE_SCORE_BOUNDS, avg_loss)
 
     phase_stats = {}
     for p, data in phases.items():
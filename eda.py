@@ -18,7 +18,7 @@ def plot_win_rate_by_color(df):
     if df.empty:
         return None
         
-    win_rates = df.groupby(['user_color', 'result']).size().reset_index(name='count')
+    win_rates = df.groupby(['user_color', 'result'], observed=True).size().reset_index(name='count')
     
     fig = px.bar(win_rates, x='user_color', y='count', color='result', 
                  title="Games Played by Color",
@@ -64,7 +64,8 @@ def plot_top_openings(df, n=10):
     if df.empty:
         return None
         
-    top_openings = df['opening_name'].value_counts().head(n).reset_index()
+    counts = df['opening_name'].value_counts()
+    top_openings = counts[counts > 0].head(n).reset_index()  # drop unused categories
     top_openings.columns = ['opening_name', 'count']
     
     fig = px.bar(top_openings, x='count', y='opening_name', orientation='h',
@@ -136,7 +137,7 @@ def plot_time_heatmap(df):
     if df.empty:
         return None
         
-    heatmap_data = df.groupby(['day_of_week', 'hour']).size().reset_index(name='count')
+    heatmap_data = df.groupby(['day_of_week', 'hour'], observed=True).size().reset_index(name='count')
     heatmap_pivot = heatmap_data.pivot(index='day_of_week', columns='hour', values='count').fillna(0)
     
     days_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
@@ -161,7 +162,7 @@ def plot_opponent_scatter(df):
     if df.empty:
         return None
         
-    bin_stats = df.groupby(['opponent_rating_bin', 'result']).size().reset_index(name='count')
+    bin_stats = df.groupby(['opponent_rating_bin', 'result'], observed=True).size().reset_index(name='count')
     bin_order = ["<1000", "1000-1200", "1200-1400", "1400-1600", "1600-1800", "1800-2000", "2000-2200", "2200+"]
     
     fig = px.bar(bin_stats, x='opponent_rating_bin', y='count', color='result',
@@ -185,7 +186,8 @@ def plot_termination_pie(df):
     if df.empty:
         return None
         
-    term_counts = df['termination'].value_counts().reset_index()
+    term_counts = df['termination'].value_counts()
+    term_counts = term_counts[term_counts > 0].reset_index()  # drop unused categories
     term_counts.columns = ['termination', 'count']
     
     fig = px.pie(term_counts, values='count', names='termination', 
@@ -209,16 +211,14 @@ def plot_correlation_heatmap(df):
     
     # Select numerical columns for correlation
     # We map 'result' to a numeric value for correlation: Win=1, Draw=0.5, Loss=0
-    df_corr = df.copy()
     result_map = {'Win': 1, 'Draw': 0.5, 'Loss': 0}
-    df_corr['result_numeric'] = df_corr['result'].map(result_map)
     
     cols = ['user_rating', 'opponent_rating', 'ply_count', 'result_numeric']
     
-    # Enforce numeric types
-    for col in cols:
-        if col in df_corr.columns:
-            df_corr[col] = pd.to_numeric(df_corr[col], errors='coerce')
+    # Project just these columns as float32 instead of copying the whole frame
+    df_corr = df[cols[:-1]].apply(pd.to_numeric, errors='coerce')
+    df_corr['result_numeric'] = df['result'].map(result_map)
+    df_corr = df_corr.astype('float32')
             
     # Drop rows with NaNs in these columns
     df_corr = df_corr.dropna(subset=cols)
@@ -319,7 +319,7 @@ def plot_opening_sunburst(df):
     # We use a simple hierarchy: Color -> Opening Name
     
     # Prepare data
-    df_sun = df.groupby(['user_color', 'opening_name']).size().reset_index(name='count')
+    df_sun = df.groupby(['user_color', 'opening_name'], observed=True).size().reset_index(name='count')
     
     # Filter for readability (remove rare openings)
     df_sun = df_sun[df_sun['count'] > 2]
@@ -327,6 +327,9 @@ def plot_opening_sunburst(df):
     if df_sun.empty:
         return None
     
+    # Sunburst paths need plain labels, not categorical columns
+    df_sun = df_sun.astype({'user_color': str, 'opening_name': str})
+    
     fig = px.sunburst(df_sun, path=['user_color', 'opening_name'], values='count',
                       title="Opening Repertoire",
                       color='user_color',